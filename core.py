@@ -0,0 +1,255 @@
+import asyncio
+import bisect
+import functools
+import hashlib
+import json
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+# ---------------------------
+# Domain model
+# ---------------------------
+@dataclass(slots=True, frozen=True)
+class House:
+    # The address is the key in house_db, so it is not stored on the row
+    price: float
+    num_bedrooms: int
+    num_bathrooms: int
+    square_feet: int
+
+
+class HouseTable:
+    """Structure-of-arrays house table: one NumPy column per House field.
+
+    `idx` maps an (interned) address to its row. Columns are over-allocated and
+    doubled when full, so inserts from the sidebar are amortized O(1); slice
+    with `[: len(table)]` before vectorized filtering. `sorted_addrs` is kept
+    in order on insert so reruns never have to re-sort it.
+    """
+
+    __slots__ = ("addrs", "sorted_addrs", "idx", "price", "beds", "baths", "sqft")
+
+    def __init__(self, capacity: int = 16):
+        self.addrs: List[str] = []
+        self.sorted_addrs: List[str] = []
+        self.idx: Dict[str, int] = {}
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.beds = np.empty(capacity, dtype=np.uint8)
+        self.baths = np.empty(capacity, dtype=np.uint8)
+        self.sqft = np.empty(capacity, dtype=np.uint16)
+
+    @classmethod
+    def from_houses(cls, houses: Mapping[str, House]) -> "HouseTable":
+        table = cls(capacity=max(16, len(houses)))
+        for address, house in houses.items():
+            table.upsert(address, house)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.addrs)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.price)
+        for name in ("price", "beds", "baths", "sqft"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def upsert(self, address: str, house: House) -> None:
+        # Only stored keys are interned; lookups use the caller's string as-is
+        address = sys.intern(address)
+        # Cast up front so an out-of-range value fails before anything is written
+        price = self.price.dtype.type(house.price)
+        beds = self.beds.dtype.type(house.num_bedrooms)
+        baths = self.baths.dtype.type(house.num_bathrooms)
+        sqft = self.sqft.dtype.type(house.square_feet)
+
+        row = self.idx.get(address)
+        new = row is None
+        if new:
+            row = len(self.addrs)
+            if row == len(self.price):
+                self._grow()
+        self.price[row] = price
+        self.beds[row] = beds
+        self.baths[row] = baths
+        self.sqft[row] = sqft
+        # Publish a new row only once its columns are written: agent runs read
+        # the table from the background loop while the script thread inserts.
+        if new:
+            self.addrs.append(address)
+            self.idx[address] = row
+            bisect.insort(self.sorted_addrs, address)
+
+    def house_price(self, address: str) -> Optional[float]:
+        row = self.idx.get(address)
+        return None if row is None else float(self.price[row])
+
+
+# ---------------------------
+# Pydantic output schema
+# ---------------------------
+class TaskOutput(BaseModel):
+    response_text: str = Field(
+        description="The response text to the client with the refined task"
+    )
+    pro_required: bool = Field(description="Whether a pro contractor is required")
+    urgency: int = Field(description="Urgency level from 1 to 10")
+
+
+@dataclass
+class FakeOutput:
+    output: TaskOutput
+
+    @functools.cached_property
+    def json(self) -> str:
+        """Serialized output, computed once per result."""
+        return self.output.model_dump_json()
+
+
+# ---------------------------
+# Response cache
+# ---------------------------
+class ResponseCache:
+    """Exact-match LRU cache of serialized TaskOutput, keyed by prompt hash."""
+
+    __slots__ = ("maxsize", "_entries")
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    @staticmethod
+    def key(
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        address: str,
+        price: Optional[float],
+    ) -> str:
+        # JSON keeps field boundaries unambiguous for free-text addresses
+        raw = json.dumps([model, system_prompt, user_prompt, address, price])
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def get_cached(self, key: str) -> Optional[TaskOutput]:
+        data = self._entries.get(key)
+        if data is None:
+            return None
+        self._entries.move_to_end(key)
+        return TaskOutput.model_validate_json(data)
+
+    def set_cached(self, key: str, result: FakeOutput) -> None:
+        self._entries[key] = result.json
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of TaskOutput keyed by prompt embedding.
+
+    Keeps the last `capacity` prompts as unit-norm float32 rows in a ring
+    buffer, so cosine similarity is one matrix-vector product. Only entries
+    with the same context (model, address, price) can match. Scores above
+    `hit` are served directly; scores in the (`gray`, `hit`] band are served
+    only if the caller's verifier confirms the two prompts ask the same thing.
+    """
+
+    __slots__ = (
+        "hit",
+        "gray",
+        "vectors",
+        "contexts",
+        "prompts",
+        "outputs",
+        "_size",
+        "_next",
+    )
+
+    def __init__(
+        self,
+        dim: int = 1536,
+        capacity: int = 5000,
+        hit: float = 0.92,
+        gray: float = 0.82,
+    ):
+        self.hit = hit
+        self.gray = gray
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.contexts = np.zeros(capacity, dtype=np.int64)
+        self.prompts: List[str] = [""] * capacity
+        self.outputs: List[Optional[TaskOutput]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+
+    @staticmethod
+    def context(model: str, address: str, price: Optional[float]) -> int:
+        raw = json.dumps([model, address, price]).encode()
+        digest = hashlib.blake2b(raw, digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)
+
+    def search(self, vector: np.ndarray, context: int) -> Tuple[float, int]:
+        """Best (score, row) among entries with this context; row is -1 if none."""
+        scores = self.vectors[: self._size] @ vector
+        scores[self.contexts[: self._size] != context] = -1.0
+        if not len(scores):
+            return -1.0, -1
+        row = int(np.argmax(scores))
+        return float(scores[row]), row
+
+    async def match(
+        self,
+        vector: np.ndarray,
+        context: int,
+        prompt: str,
+        verify: Callable[[str, str], Awaitable[bool]],
+    ) -> Optional[TaskOutput]:
+        score, row = self.search(vector, context)
+        if score > self.hit:
+            return self.outputs[row]
+        if score > self.gray and await verify(self.prompts[row], prompt):
+            return self.outputs[row]
+        return None
+
+    def add(
+        self, vector: np.ndarray, context: int, prompt: str, output: TaskOutput
+    ) -> None:
+        row = self._next
+        self.vectors[row] = vector
+        self.contexts[row] = context
+        self.prompts[row] = prompt
+        self.outputs[row] = output
+        self._next = (row + 1) % len(self.prompts)
+        self._size = min(self._size + 1, len(self.prompts))
+
+
+class InflightRequests:
+    """Deduplicates identical agent runs that are in flight at the same time.
+
+    The first request for a key is sent at once; later requests with the same
+    key await its result instead of starting another run. Keys must be scoped
+    to a session, because a run's tool calls read that session's house table.
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def submit(
+        self, key: str, call: Callable[[], Awaitable[TaskOutput]]
+    ) -> TaskOutput:
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shielded so one waiter going away does not cancel the shared run
+        return await asyncio.shield(future)
@@ -1,10 +1,29 @@
 import os
 import asyncio
-from dataclasses import dataclass
-from typing import Dict
+import concurrent.futures
+import threading
+import uuid
+from types import MappingProxyType
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+)
 
+import httpx
 import streamlit as st
-from pydantic import BaseModel, Field
+
+from core import (
+    FakeOutput,
+    House,
+    HouseTable,
+    InflightRequests,
+    ResponseCache,
+    TaskOutput,
+)
 
 # Ensure API key is set (supports either env var or st.secrets)
 # openai_key = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY", None)
@@ -12,91 +31,200 @@ openai_key = "key_required"
 if openai_key:
     os.environ["OPENAI_API_KEY"] = openai_key
 
-from pydantic_ai import Agent
+# Any OpenAI-compatible model; point OPENAI_BASE_URL at a self-hosted server
+# (e.g. vLLM) to use a local quantized model instead.
+MODEL = os.getenv("MODEL", "gpt-4o-mini").removeprefix("openai:")
+# EMBEDDING_MODEL = "text-embedding-3-small"  # semantic cache, live path only
+
+from pydantic_ai import Agent, RunContext
 
 
 # ---------------------------
 # Domain model & DB wrapper
 # ---------------------------
-@dataclass
-class House:
-    address: str
-    price: float
-    num_bedrooms: int
-    num_bathrooms: int
-    square_feet: int
-
-
-def _default_db() -> Dict[str, House]:
-    return {
+# Built once at import; House is frozen, so sessions can share these rows
+_DEFAULT_DB: Mapping[str, House] = MappingProxyType(
+    {
         "123 Main St": House(
-            address="123 Main St",
             price=350000,
             num_bedrooms=3,
             num_bathrooms=2,
             square_feet=1500,
         ),
         "456 Oak Ave": House(
-            address="456 Oak Ave",
             price=450000,
             num_bedrooms=4,
             num_bathrooms=3,
             square_feet=2000,
         ),
         "789 Pine Rd": House(
-            address="789 Pine Rd",
             price=250000,
             num_bedrooms=2,
             num_bathrooms=1,
             square_feet=900,
         ),
     }
+)
 
 
 class DatabaseConn:
-    """Async facade around the in-memory DB kept in st.session_state."""
+    """Facade around the in-memory DB kept in st.session_state.
 
-    async def house_price(self, address: str) -> float:
-        house = st.session_state.house_db.get(address)
-        if house:
-            return float(house.price)
-        raise ValueError("House not found")
+    Holds a reference to the session's table because agent runs execute on the
+    background loop, where st.session_state is not available. One instance is
+    built per agent run, so prices looked up during the run are memoized.
+    """
+
+    __slots__ = ("house_db", "_prices")
+
+    _UNSEEN = object()
+
+    def __init__(self, house_db: HouseTable):
+        self.house_db = house_db
+        self._prices: Dict[str, Optional[float]] = {}
+
+    def house_price(self, address: str) -> Optional[float]:
+        """Price for an exact address match, or None if the house is unknown."""
+        price = self._prices.get(address, self._UNSEEN)
+        if price is self._UNSEEN:
+            price = self._prices[address] = self.house_db.house_price(address)
+        return price
 
 
 # ---------------------------
-# Pydantic output schema
+# Agent definition (pydantic-ai)
 # ---------------------------
-class TaskOutput(BaseModel):
-    response_text: str = Field(
-        description="The response text to the client with the refined task"
+# Kept static and byte-identical across calls so the provider's prompt-prefix
+# cache can hit; anything per-request (address, task) goes in the user message.
+_SYSTEM_PROMPT = (
+    "You are a home renovation expert. Given a task description, determine if a professional "
+    "contractor is needed and the urgency level. Give a brief description of the steps to execute "
+    "the task and also dedicate a section to describing the benefit of hiring a professional contractor "
+    "for this task. If the user gives an address, consult the tool get_house_price to retrieve the house price."
+)
+
+
+async def get_house_price(
+    ctx: RunContext[DatabaseConn], address: str
+) -> Optional[float]:
+    """Look up the price of a house by full address (exact match).
+
+    Returns null if no house with that address is known.
+    """
+    # Stays async: pydantic-ai sends plain-def tools through a thread pool
+    return ctx.deps.house_price(address)
+
+
+@st.cache_resource
+def _get_http_client() -> httpx.AsyncClient:
+    """Keep-alive connection pool shared by every OpenAI call in the process."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
     )
-    pro_required: bool = Field(description="Whether a pro contractor is required")
-    urgency: int = Field(description="Urgency level from 1 to 10")
 
 
-@dataclass
-class FakeOutput:
-    output: TaskOutput
+@st.cache_resource
+def get_agent() -> Agent[DatabaseConn, TaskOutput]:
+    """One agent per worker process, sharing a keep-alive HTTP connection pool."""
+    # Imported here so pydantic_ai still loads only after the key setup above
+    from pydantic_ai.models.openai import OpenAIChatModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    provider = OpenAIProvider(http_client=_get_http_client())
+    model = OpenAIChatModel(MODEL, provider=provider)
+    # output_type must be passed explicitly (the generic parameters are type
+    # hints only); the agent builds the TaskOutput JSON schema once, here, and
+    # reuses it for every run.
+    agent = Agent[DatabaseConn, TaskOutput](
+        model=model,
+        deps_type=DatabaseConn,
+        output_type=TaskOutput,
+        system_prompt=_SYSTEM_PROMPT,
+    )
+    agent.tool(get_house_price)
+    return agent
+
+
+# Semantic cache helpers for the commented-out live agent path
+# (re-enable with `from openai import AsyncOpenAI` and EMBEDDING_MODEL):
+#
+# async def _embed(client: AsyncOpenAI, text: str) -> np.ndarray:
+#     response = await client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+#     vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+#     return vector / np.linalg.norm(vector)
+#
+#
+# async def _same_request(client: AsyncOpenAI, cached: str, new: str) -> bool:
+#     """Cheap yes/no check for near-duplicate prompts in the gray zone."""
+#     response = await client.chat.completions.create(
+#         model=MODEL,
+#         max_tokens=1,
+#         messages=[
+#             {
+#                 "role": "user",
+#                 "content": (
+#                     "Do these two home renovation requests ask for the same thing? "
+#                     f"Answer yes or no.\n1. {cached}\n2. {new}"
+#                 ),
+#             }
+#         ],
+#     )
+#     return (response.choices[0].message.content or "").strip().lower() == "yes"
 
 
 # ---------------------------
-# Agent definition (pydantic-ai)
+# Background event loop
 # ---------------------------
-refiner_agent = Agent[DatabaseConn, TaskOutput](
-    model="openai:gpt-4o",
-    system_prompt=(
-        "You are a home renovation expert. Given a task description, determine if a professional "
-        "contractor is needed and the urgency level. Give a brief description of the steps to execute "
-        "the task and also dedicate a section to describing the benefit of hiring a professional contractor "
-        "for this task. If the user gives an address, consult the tool get_house_price to retrieve the house price."
-    ),
-)
+@st.cache_resource
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """One long-lived loop on a daemon thread, shared across reruns and sessions."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+_LOOP = _get_loop()
+
+
+async def _warmup(http_client: httpx.AsyncClient) -> None:
+    """Pay one-time costs (validator, TLS handshake) before the first click."""
+    TaskOutput.model_validate(
+        {"response_text": "", "pro_required": False, "urgency": 1}
+    )
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    try:
+        await http_client.get(f"{base_url.rstrip('/')}/models", timeout=2.0)
+    except httpx.HTTPError:
+        pass
+
+
+@st.cache_resource
+def _start_warmup() -> concurrent.futures.Future:
+    return asyncio.run_coroutine_threadsafe(_warmup(_get_http_client()), _LOOP)
+
+
+_start_warmup()
+
+
+async def _anext(agen: AsyncIterator[str]) -> str:
+    return await agen.__anext__()
 
 
-@refiner_agent.tool
-async def get_house_price(ctx, address: str) -> float:
-    """Look up the price of a house by full address (exact match)."""
-    return await ctx.deps.house_price(address)
+def _astream_to_sync(agen: AsyncIterator[str]) -> Iterator[str]:
+    """Drive an async generator on the background loop from the script thread."""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(_anext(agen), _LOOP).result()
+        except StopAsyncIteration:
+            return
+
+
+@st.cache_resource
+def _get_inflight() -> InflightRequests:
+    return InflightRequests()
+
+
+_INFLIGHT = _get_inflight()
 
 
 # ---------------------------
@@ -106,7 +234,15 @@ st.set_page_config(page_title="Renovation Task Refiner", page_icon="🏠", layou
 
 # Initialize DB in session_state
 if "house_db" not in st.session_state:
-    st.session_state.house_db: Dict[str, House] = _default_db()
+    st.session_state.house_db: HouseTable = HouseTable.from_houses(_DEFAULT_DB)
+
+# Scopes in-flight request sharing to this session
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Response cache survives reruns for the lifetime of the session
+if "resp_cache" not in st.session_state:
+    st.session_state.resp_cache = ResponseCache()
 
 st.title("🏠 Unicorn Dave")
 
@@ -120,35 +256,45 @@ with st.sidebar:
             price = st.number_input(
                 "Price ($)", min_value=0.0, step=1000.0, value=350000.0
             )
-            beds = st.number_input("Bedrooms", min_value=0, step=1, value=3)
+            beds = st.number_input(
+                "Bedrooms", min_value=0, max_value=255, step=1, value=3
+            )
         with col2:
-            baths = st.number_input("Bathrooms", min_value=0, step=1, value=2)
-            sqft = st.number_input("Square feet", min_value=0, step=50, value=1200)
+            baths = st.number_input(
+                "Bathrooms", min_value=0, max_value=255, step=1, value=2
+            )
+            sqft = st.number_input(
+                "Square feet", min_value=0, max_value=65535, step=50, value=1200
+            )
         submitted = st.form_submit_button("Save house")
 
     if submitted:
         if not addr.strip():
             st.error("Please provide an address before saving.")
         else:
-            st.session_state.house_db[addr.strip()] = House(
-                address=addr.strip(),
-                price=float(price),
-                num_bedrooms=int(beds),
-                num_bathrooms=int(baths),
-                square_feet=int(sqft),
+            st.session_state.house_db.upsert(
+                addr.strip(),
+                House(
+                    price=float(price),
+                    num_bedrooms=int(beds),
+                    num_bathrooms=int(baths),
+                    square_feet=int(sqft),
+                ),
             )
             st.success(f"Saved: {addr}")
 
     st.divider()
     # st.caption("Database preview")
-    # if st.session_state.house_db:
-    #     preview = [{
-    #         "address": h.address,
-    #         "price": h.price,
-    #         "bedrooms": h.num_bedrooms,
-    #         "bathrooms": h.num_bathrooms,
-    #         "sqft": h.square_feet,
-    #     } for h in st.session_state.house_db.values()]
+    # table = st.session_state.house_db
+    # if len(table):
+    #     n = len(table)
+    #     preview = {
+    #         "address": table.addrs,
+    #         "price": table.price[:n],
+    #         "bedrooms": table.beds[:n],
+    #         "bathrooms": table.baths[:n],
+    #         "sqft": table.sqft[:n],
+    #     }
     #     st.dataframe(preview, use_container_width=True, hide_index=True)
     # else:
     #     st.info("No houses yet. Use the form above to add one.")
@@ -164,7 +310,7 @@ with left:
         height=140,
     )
 
-    addr_options = sorted(st.session_state.house_db.keys())
+    addr_options = st.session_state.house_db.sorted_addrs
     st.subheader("House context (optional)")
     if addr_options:
         selected_addr = st.selectbox(
@@ -184,43 +330,107 @@ with left:
             st.error("Please provide a task description.")
         else:
             # Build dependencies: we pass the DB connection; address is passed via the prompt itself.
-            deps = DatabaseConn()
-
-            async def _run():
-                # return await refiner_agent.run(
+            agent = get_agent()
+            deps = DatabaseConn(st.session_state.house_db)
+            selected_price = st.session_state.house_db.house_price(selected_addr)
+            session_id = st.session_state.session_id
+            cache: ResponseCache = st.session_state.resp_cache
+            cache_key = ResponseCache.key(
+                MODEL, _SYSTEM_PROMPT, user_prompt, selected_addr, selected_price
+            )
+            # Semantic cache, per session so no user is served another's answer;
+            # only used on the live agent path below (import SemanticCache from core):
+            # if "semantic_cache" not in st.session_state:
+            #     st.session_state.semantic_cache = SemanticCache()
+            # semantic: SemanticCache = st.session_state.semantic_cache
+            # semantic_ctx = SemanticCache.context(MODEL, selected_addr, selected_price)
+
+            async def _call_agent(on_text: Callable[[str], None]) -> TaskOutput:
+                # client = agent.model.client
+                # vector = await _embed(client, user_prompt)
+                # output = await semantic.match(
+                #     vector,
+                #     semantic_ctx,
+                #     user_prompt,
+                #     lambda cached, new: _same_request(client, cached, new),
+                # )
+                # if output is not None:
+                #     on_text(output.response_text)
+                #     return output
+                #
+                # async with agent.run_stream(
                 #     deps=deps,
                 #     user_prompt=(
                 #         user_prompt
                 #         if not selected_addr
                 #         else f"Address: {selected_addr}. Task: {user_prompt}"
                 #     ),
-                # )
-
-                return FakeOutput(
-                    TaskOutput(
-                        response_text="David kan je een API aanvragen en credits erop zetten en die met mij delen?",
-                        pro_required=True,
-                        urgency=10,
+                # ) as stream:
+                #     sent = ""
+                #     async for partial in stream.stream_output():
+                #         text = partial.response_text or ""
+                #         if len(text) > len(sent):
+                #             on_text(text[len(sent):])
+                #             sent = text
+                #     output = await stream.get_output()
+                # semantic.add(vector, semantic_ctx, user_prompt, output)
+                # return output
+
+                output = TaskOutput(
+                    response_text="David kan je een API aanvragen en credits erop zetten en die met mij delen?",
+                    pro_required=True,
+                    urgency=10,
+                )
+                on_text(output.response_text)
+                return output
+
+            final: Dict[str, FakeOutput] = {}
+
+            async def _stream() -> AsyncIterator[str]:
+                cached = cache.get_cached(cache_key)
+                if cached is not None:
+                    final["result"] = FakeOutput(cached)
+                    yield cached.response_text
+                    return
+
+                deltas: asyncio.Queue = asyncio.Queue()
+                run = asyncio.ensure_future(
+                    _INFLIGHT.submit(
+                        f"{session_id}:{cache_key}",
+                        lambda: _call_agent(deltas.put_nowait),
                     )
                 )
+                streamed = False
+                while not run.done():
+                    next_delta = asyncio.ensure_future(deltas.get())
+                    await asyncio.wait(
+                        {run, next_delta}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if next_delta.done():
+                        streamed = True
+                        yield next_delta.result()
+                    else:
+                        next_delta.cancel()
+                while not deltas.empty():
+                    streamed = True
+                    yield deltas.get_nowait()
+
+                output = run.result()
+                # Joined a run already in flight: no deltas, emit in one go
+                if not streamed:
+                    yield output.response_text
+                final["result"] = result = FakeOutput(output)
+                cache.set_cached(cache_key, result)
 
             with st.spinner("Thinking..."):
                 try:
-                    result = asyncio.run(_run())
-                except RuntimeError as e:
-                    # Handle potential 'event loop is running' issues by creating a new loop
-                    loop = asyncio.new_event_loop()
-                    try:
-                        asyncio.set_event_loop(loop)
-                        result = loop.run_until_complete(_run())
-                    finally:
-                        loop.close()
+                    st.write("### Result")
+                    st.write_stream(_astream_to_sync(_stream()))
+                    result = final["result"]
                 except Exception as e:
                     st.exception(e)
                 else:
                     st.success("Done!")
-                    st.write("### Result")
-                    st.markdown(result.output.response_text)
                     st.write("### Assessment")
                     c1, c2 = st.columns(2)
                     with c1:
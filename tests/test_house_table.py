@@ -0,0 +1,67 @@
+import pytest
+
+from core import House, HouseTable
+
+
+def _house(price: float) -> House:
+    return House(price=price, num_bedrooms=3, num_bathrooms=2, square_feet=1500)
+
+
+def test_grows_past_capacity():
+    table = HouseTable(capacity=2)
+    for i in range(5):
+        table.upsert(f"{i} Elm St", _house(100_000 + i))
+
+    assert len(table) == 5
+    assert len(table.price) == 8
+    assert [table.house_price(f"{i} Elm St") for i in range(5)] == [
+        100_000,
+        100_001,
+        100_002,
+        100_003,
+        100_004,
+    ]
+
+
+def test_sorted_addrs_follow_upserts():
+    table = HouseTable()
+    for address in ("789 Pine Rd", "123 Main St", "456 Oak Ave"):
+        table.upsert(address, _house(1))
+    table.upsert("123 Main St", _house(2))
+
+    assert table.sorted_addrs == ["123 Main St", "456 Oak Ave", "789 Pine Rd"]
+    assert table.addrs == ["789 Pine Rd", "123 Main St", "456 Oak Ave"]
+
+
+def test_upsert_updates_existing_row():
+    table = HouseTable.from_houses({"123 Main St": _house(350_000)})
+    table.upsert("123 Main St", _house(1_234_567.89))
+
+    assert len(table) == 1
+    assert table.house_price("123 Main St") == 1_234_567.89
+
+
+def test_unknown_address_returns_none():
+    table = HouseTable.from_houses({"123 Main St": _house(350_000)})
+
+    assert table.house_price("124 Main St") is None
+
+
+def test_rejected_upsert_leaves_table_unchanged():
+    table = HouseTable.from_houses({"123 Main St": _house(350_000)})
+
+    with pytest.raises(OverflowError):
+        table.upsert(
+            "x", House(price=1.0, num_bedrooms=300, num_bathrooms=1, square_feet=1)
+        )
+    with pytest.raises(OverflowError):
+        table.upsert(
+            "123 Main St",
+            House(price=1.0, num_bedrooms=3, num_bathrooms=2, square_feet=70_000),
+        )
+
+    assert len(table) == 1
+    assert table.idx == {"123 Main St": 0}
+    assert table.sorted_addrs == ["123 Main St"]
+    assert table.house_price("x") is None
+    assert table.house_price("123 Main St") == 350_000
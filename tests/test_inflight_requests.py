@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from core import InflightRequests
+
+
+def test_identical_keys_share_one_call():
+    inflight = InflightRequests()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(
+            inflight.submit("k", call), inflight.submit("k", call)
+        )
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert len(calls) == 1
+
+
+def test_distinct_keys_run_separately():
+    inflight = InflightRequests()
+    calls = []
+
+    def make(key):
+        async def call():
+            calls.append(key)
+            return key.upper()
+
+        return call
+
+    async def main():
+        return await asyncio.gather(
+            inflight.submit("a", make("a")), inflight.submit("b", make("b"))
+        )
+
+    assert asyncio.run(main()) == ["A", "B"]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_key_is_released_after_completion():
+    inflight = InflightRequests()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first = await inflight.submit("k", call)
+        second = await inflight.submit("k", call)
+        return first, second
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_errors_reach_every_waiter():
+    inflight = InflightRequests()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            inflight.submit("k", call),
+            inflight.submit("k", call),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert inflight._pending == {}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_run():
+    inflight = InflightRequests()
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(inflight.submit("k", call))
+        second = asyncio.ensure_future(inflight.submit("k", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
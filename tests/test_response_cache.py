@@ -0,0 +1,37 @@
+from core import FakeOutput, ResponseCache, TaskOutput
+
+
+def _result(text: str) -> FakeOutput:
+    return FakeOutput(TaskOutput(response_text=text, pro_required=False, urgency=1))
+
+
+def test_roundtrip():
+    cache = ResponseCache()
+    cache.set_cached("k", _result("hello"))
+
+    assert cache.get_cached("k") == TaskOutput(
+        response_text="hello", pro_required=False, urgency=1
+    )
+    assert cache.get_cached("missing") is None
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2)
+    cache.set_cached("a", _result("a"))
+    cache.set_cached("b", _result("b"))
+    cache.get_cached("a")
+    cache.set_cached("c", _result("c"))
+
+    assert cache.get_cached("b") is None
+    assert cache.get_cached("a").response_text == "a"
+    assert cache.get_cached("c").response_text == "c"
+
+
+def test_key_keeps_field_boundaries():
+    key = ResponseCache.key
+    assert key("m", "s", "paint|1 Elm", "St", None) != key(
+        "m", "s", "paint", "1 Elm|St", None
+    )
+    assert key("m", "s", "paint", "1 Elm St", 1.0) != key(
+        "m", "s", "paint", "1 Elm St", 2.0
+    )
@@ -0,0 +1,66 @@
+import asyncio
+
+import numpy as np
+
+from core import SemanticCache, TaskOutput
+
+
+def _unit(*values: float) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _output(text: str) -> TaskOutput:
+    return TaskOutput(response_text=text, pro_required=False, urgency=1)
+
+
+async def _reject(cached: str, new: str) -> bool:
+    return False
+
+
+def test_empty_cache_has_no_match():
+    cache = SemanticCache(dim=3, capacity=2)
+
+    assert cache.search(_unit(1, 0, 0), 0) == (-1.0, -1)
+
+
+def test_only_matches_same_context():
+    cache = SemanticCache(dim=3, capacity=4)
+    ctx = SemanticCache.context("m", "123 Main St", 350000.0)
+    other = SemanticCache.context("m", "456 Oak Ave", 350000.0)
+    cache.add(_unit(1, 0, 0), ctx, "hang paintings", _output("a"))
+
+    assert (
+        asyncio.run(cache.match(_unit(1, 0, 0), ctx, "q", _reject)).response_text == "a"
+    )
+    assert asyncio.run(cache.match(_unit(1, 0, 0), other, "q", _reject)) is None
+
+
+def test_gray_zone_defers_to_verifier():
+    cache = SemanticCache(dim=3, capacity=4)
+    cache.add(_unit(1, 0, 0), 0, "hang paintings", _output("a"))
+    seen = []
+
+    async def accept(cached: str, new: str) -> bool:
+        seen.append((cached, new))
+        return True
+
+    # cosine ~0.86: above gray (0.82), below hit (0.92)
+    query = _unit(1, 0.6, 0)
+    assert asyncio.run(cache.match(query, 0, "mount art", _reject)) is None
+    assert asyncio.run(cache.match(query, 0, "mount art", accept)).response_text == "a"
+    assert seen == [("hang paintings", "mount art")]
+
+
+def test_ring_buffer_overwrites_oldest():
+    cache = SemanticCache(dim=3, capacity=2)
+    cache.add(_unit(1, 0, 0), 0, "first", _output("first"))
+    cache.add(_unit(0, 1, 0), 0, "second", _output("second"))
+    cache.add(_unit(0, 0, 1), 0, "third", _output("third"))
+
+    assert cache.prompts == ["third", "second"]
+    assert asyncio.run(cache.match(_unit(1, 0, 0), 0, "q", _reject)) is None
+    assert (
+        asyncio.run(cache.match(_unit(0, 0, 1), 0, "q", _reject)).response_text
+        == "third"
+    )